@@ -0,0 +1,26 @@
+"""
+Export all-MiniLM-L6-v2 as an INT8 static-quantized OpenVINO model.
+Run once offline; RAGSystem picks it up automatically on next start.
+"""
+
+from sentence_transformers import SentenceTransformer, export_static_quantized_openvino_model
+from optimum.intel import OVQuantizationConfig
+import logging
+
+from rag_system import QUANTIZED_MODEL_PATH
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    logger.info("Loading all-MiniLM-L6-v2 with OpenVINO backend")
+    model = SentenceTransformer("all-MiniLM-L6-v2", backend="openvino")
+
+    # Tokenizer/pooling config must live next to the quantized weights
+    model.save(QUANTIZED_MODEL_PATH)
+
+    logger.info("Quantizing to INT8 (this takes a minute)")
+    export_static_quantized_openvino_model(model, OVQuantizationConfig(), QUANTIZED_MODEL_PATH)
+
+    logger.info("✅ Quantized model saved to %s", QUANTIZED_MODEL_PATH)
@@ -1,13 +1,81 @@
-import faiss
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from typing import List, Tuple, Dict
+from sentence_transformers.util import batch_to_device
+from typing import List, Tuple, NamedTuple, Optional
+from collections import OrderedDict
+import functools
+import glob
+import hashlib
 import os
+import threading
+import re
+import tempfile
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# INT8 OpenVINO export of all-MiniLM-L6-v2 (see export_model.py)
+QUANTIZED_MODEL_PATH = "models/miniLM-ov-int8"
+QUANTIZED_MODEL_FILE = "openvino/openvino_model_qint8_quantized.xml"
+FP32_MODEL_NAME = "all-MiniLM-L6-v2"
+
+EMBED_CACHE_SIZE = 512
+
+# Header of one blank-line-separated FAQ block: the "Question:" line followed
+# by "Answer:"; the rest of the block is the answer
+_FAQ_PATTERN = re.compile(r'^Question:[ \t]*(.*)\nAnswer:[ \t]*', re.M)
+
+# Past this many FAQs brute force gets slow, switch to a FAISS HNSW index
+HNSW_MIN_SIZE = 2048
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 40
+# HNSW stores INT8 scalar-quantized vectors; fetch this many times top_k
+# candidates and rescore them exactly against the float32 matrix
+HNSW_RESCORE_FACTOR = 4
+
+
+def _atomic_write(path: str, write):
+    """
+    Call write(tmp_path) then rename over path, so other job processes
+    sharing the directory never mmap/read a half-written cache file
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _prune_stale_caches(path: str, h: str):
+    """Delete cache files left over from earlier versions of the knowledge base"""
+    prefix = glob.escape(path)
+    for stale in glob.glob(f"{prefix}.*.emb.npy") + glob.glob(f"{prefix}.*.faiss"):
+        if stale.startswith(f"{path}.{h}."):
+            continue
+        try:
+            os.remove(stale)
+            logger.info("Removed stale cache %s", stale)
+        except OSError:
+            # e.g. still mapped by another process on Windows; retried next start
+            pass
+
+
+class Answer(NamedTuple):
+    """Best knowledge base match for a query"""
+    question: str
+    answer: str
+    confidence: float  # cosine similarity
+    matched_question: Optional[str]
+    distance: float  # cosine distance, 1 - confidence
+
 
 class RAGSystem:
     
@@ -16,24 +84,57 @@ class RAGSystem:
         "made RAG with knowledge "
         logger.info("Initializing RAG Sys")
         
-        logger.info("Loading sentence_transformer model")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Loaded on first use; skipped entirely when cached embeddings exist
+        self._model = None
+        self._model_lock = threading.Lock()
+        # Check the weights, not the folder: a failed export leaves the folder behind
+        self.quantized = os.path.isfile(os.path.join(QUANTIZED_MODEL_PATH, QUANTIZED_MODEL_FILE))
         
         self.documents = []
+        self._qa_formatted = []  # "Q: ...\nA: ..." per FAQ, used by get_context
         self.questions = []
         self.answers = []
-        self.index = None
+        self.E = None  # normalized question embeddings, one row per FAQ
+        self.index = None  # FAISS HNSW index, only for large knowledge bases
+        self.ef_search = 16  # HNSW recall/latency knob, read on every search
+        
+        # Query embedding caches: exact string -> embedding, and
+        # order-invariant token key -> embedding for near-duplicate phrasings
+        self._embed_cache = functools.lru_cache(maxsize=EMBED_CACHE_SIZE)(self._embed_one)
+        self._pooled_cache = OrderedDict()
+        self._pooled_lock = threading.Lock()
         
         # Load knowledge
         if os.path.exists(knowledge_base_path):
             self._load_knowledge_base(knowledge_base_path)
         else:
-            logger.info(f"Knowledge base not found, creating sample")
+            logger.info("Knowledge base not found, creating sample")
             self._create_sample_knowledge_base(knowledge_base_path)
             self._load_knowledge_base(knowledge_base_path)
         
         logger.info("RAG System ready!\n")
     
+    @property
+    def model(self) -> SentenceTransformer:
+        """Sentence encoder, loaded on first access"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+    
+    def _load_model(self) -> SentenceTransformer:
+        if self.quantized:
+            logger.info("Loading INT8 OpenVINO sentence_transformer model")
+            return SentenceTransformer(
+                QUANTIZED_MODEL_PATH,
+                backend="openvino",
+                model_kwargs={"file_name": QUANTIZED_MODEL_FILE},
+            )
+        
+        logger.info("Quantized model not found, loading FP32 sentence_transformer model")
+        return SentenceTransformer(FP32_MODEL_NAME)
+    
     def _create_sample_knowledge_base(self, path: str):
         "Create FAQ knowledge"
         content = """Question: What are your business hours?
@@ -63,42 +164,145 @@ Answer: Yes, you can change your plan at any time. Upgrades take effect immediat
         os.makedirs(os.path.dirname(path), exist_ok=True)
         with open(path, 'w', encoding='utf-8') as f:
             f.write(content)
-        logger.info(f"Created knowledge base at {path}")
+        logger.info("Created knowledge base at %s", path)
     
     def _load_knowledge_base(self, path: str):
         """Load and index knowledge base"""
-        logger.info(f"Loading knowledge base from {path}")
+        logger.info("Loading knowledge base from %s", path)
         
         with open(path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-       
-        pairs = content.strip().split('\n\n')
+        matches = []
+        search = _FAQ_PATTERN.search
+        for block in content.strip().split('\n\n'):
+            m = search(block)
+            if m:
+                matches.append((m[1].rstrip(), block[m.end():].rstrip()))
+                self.documents.append(block)
+        
+        if matches:
+            self.questions, self.answers = map(list, zip(*matches))
+            self._qa_formatted = [f"Q: {q}\nA: {a}" for q, a in matches]
+        
+        logger.info("✅ Loaded %d Q&A pairs", len(self.questions))
+        
+        # Cache files are keyed by file content and which model embedded it
+        model_id = QUANTIZED_MODEL_PATH if self.quantized else FP32_MODEL_NAME
+        h = hashlib.sha256((model_id + "\n" + content).encode()).hexdigest()[:16]
+        emb_path = f"{path}.{h}.emb.npy"
+        
+        if os.path.exists(emb_path):
+            logger.info("Loading cached embeddings from %s", emb_path)
+            self.E = np.load(emb_path, mmap_mode='r')
+        else:
+            # for better matching
+            logger.info("creating embeddings")
+            embeddings = self.model.encode(
+                self.questions,
+                batch_size=64,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+            
+            # Normalized vectors + dot product = cosine similarity.
+            # For a few thousand FAQs a single GEMV beats any ANN index.
+            self.E = np.ascontiguousarray(embeddings, dtype=np.float32)
+            
+            try:
+                _atomic_write(emb_path, self._save_embeddings)
+            except OSError as e:
+                logger.warning("Could not cache embeddings: %s", e)
+        
+        logger.info("Embedding matrix built successfully")
         
-        for pair in pairs:
-            if 'Question:' in pair and 'Answer:' in pair:
-                parts = pair.split('Answer:')
-                question = parts[0].replace('Question:', '').strip()
-                answer = parts[1].strip()
-                
-                self.questions.append(question)
-                self.answers.append(answer)
-                self.documents.append(pair)
+        if len(self.questions) >= HNSW_MIN_SIZE:
+            self._build_hnsw_index(f"{path}.{h}.hnsw-sq8.faiss")
         
-        logger.info(f"✅ Loaded {len(self.questions)} Q&A pairs")
+        _prune_stale_caches(path, h)
+    
+    def _save_embeddings(self, tmp_path: str):
+        # File object, since np.save appends .npy to bare paths
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.E)
+    
+    def _build_hnsw_index(self, index_path: str):
+        """Build (or read back) an INT8 FAISS HNSW index over self.E (faiss is optional)"""
+        try:
+            import faiss
+        except ImportError:
+            logger.warning("faiss not installed, using brute-force search")
+            return
         
-        # for better matching
-        logger.info("creating embeddings")
-        embeddings = self.model.encode(self.questions, show_progress_bar=True)
+        if os.path.exists(index_path):
+            logger.info("Loading cached FAISS index from %s", index_path)
+            self.index = faiss.read_index(index_path)
+            return
         
-        # Build FAISS index
-        logger.info("Building FAISS index")
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(np.array(embeddings).astype('float32'))
+        logger.info("Building FAISS HNSW index")
+        embeddings = np.ascontiguousarray(self.E)
+        self.index = faiss.IndexHNSWSQ(
+            embeddings.shape[1], faiss.ScalarQuantizer.QT_8bit, HNSW_M, faiss.METRIC_INNER_PRODUCT
+        )
+        self.index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+        self.index.train(embeddings)  # learns per-dimension INT8 ranges
+        self.index.add(embeddings)
+        
+        try:
+            _atomic_write(index_path, lambda tmp_path: faiss.write_index(self.index, tmp_path))
+        except (OSError, RuntimeError) as e:
+            logger.warning("Could not cache FAISS index: %s", e)
         
         logger.info("FAISS index built successfully")
     
+    @staticmethod
+    def _token_key(query: str) -> str:
+        """Order-invariant key: sorted, lowercased word tokens"""
+        return " ".join(sorted(re.findall(r"\w+", query.lower())))
+    
+    def _embed_one(self, query: str) -> np.ndarray:
+        """Embed a single query, reusing pooled embeddings of reordered duplicates"""
+        key = self._token_key(query)
+        
+        with self._pooled_lock:
+            embedding = self._pooled_cache.get(key)
+            if embedding is not None:
+                self._pooled_cache.move_to_end(key)
+                return embedding
+        
+        embedding = self._encode_query(query)
+        # Shared by every caller via both caches, so in-place edits must fail
+        embedding.setflags(write=False)
+        
+        with self._pooled_lock:
+            self._pooled_cache[key] = embedding
+            if len(self._pooled_cache) > EMBED_CACHE_SIZE:
+                self._pooled_cache.popitem(last=False)
+        
+        return embedding
+    
+    def _encode_query(self, query: str) -> np.ndarray:
+        """
+        Tokenize + forward + normalize a single query, shape (1, dim)
+        
+        Same result as model.encode([query], normalize_embeddings=True) but
+        skips encode()'s per-call length sorting, batching loop and
+        progress-bar setup, which dominate for a single short sentence
+        """
+        model = self.model
+        features = batch_to_device(model.tokenize([query]), model.device)
+        
+        with torch.inference_mode():
+            embedding = model(features)["sentence_embedding"]
+        
+        embedding = torch.nn.functional.normalize(embedding, p=2, dim=1)
+        return embedding.cpu().numpy().astype(np.float32, copy=False)
+    
+    def embed(self, query: str) -> np.ndarray:
+        """Normalized (cached) embedding of a query, shape (dim,)"""
+        return self._embed_cache(query)[0]
+    
     def search(self, query: str, top_k: int = 1) -> List[Tuple[int, float]]:
         """
         Search for most relevant Q&A pairs
@@ -108,28 +312,38 @@ Answer: Yes, you can change your plan at any time. Upgrades take effect immediat
             top_k: Number of results to return
             
         Returns:
-            List of (index, distance) tuples
+            List of (index, similarity) tuples, similarity is cosine in [-1, 1]
         """
-        if not self.questions or self.index is None:
+        if not self.questions or self.E is None:
             return []
         
-        # Embed the query
-        query_embedding = self.model.encode([query])
+        # Embed the query (cached - get_answer/get_context often repeat it)
+        query_embedding = self.embed(query)
         
-        # Search in FAISS index
-        distances, indices = self.index.search(
-            np.array(query_embedding).astype('float32'),
-            top_k
-        )
+        if self.index is not None:
+            self.index.hnsw.efSearch = self.ef_search
+            k = min(top_k * HNSW_RESCORE_FACTOR, len(self.questions))
+            _, indices = self.index.search(query_embedding[None, :], k)
+            
+            # Exact rescore of the INT8 candidates
+            candidates = indices[0][indices[0] >= 0]
+            scores = self.E[candidates] @ query_embedding
+            order = np.argsort(-scores)[:top_k]
+            return [(int(candidates[i]), float(scores[i])) for i in order]
+        
+        scores = self.E @ query_embedding
         
-        results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx < len(self.questions):
-                results.append((int(idx), float(distance)))
+        # Partial sort for the top_k best, then order just those
+        top_k = min(top_k, len(scores))
+        if top_k < len(scores):
+            indices = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            indices = np.arange(len(scores))
+        indices = indices[np.argsort(-scores[indices])]
         
-        return results
+        return [(int(idx), float(scores[idx])) for idx in indices]
     
-    def get_answer(self, query: str) -> Dict[str, str]:
+    def get_answer(self, query: str) -> Answer:
         """
         Get the best answer for a query
         
@@ -137,31 +351,23 @@ Answer: Yes, you can change your plan at any time. Upgrades take effect immediat
             query: User's question
             
         Returns:
-            Dictionary with question, answer, and confidence
+            Answer with question, answer, confidence and matched question
         """
         results = self.search(query, top_k=1)
         
         if not results:
-            return {
-                'question': query,
-                'answer': "I don't have information about that in my knowledge base.",
-                'confidence': 0.0,
-                'matched_question': None
-            }
-        
-        idx, distance = results[0]
-        
-        # Lower distance = better match
-        # Convert distance to confidence score (0-1)
-        confidence = max(0.0, 1.0 - (distance / 10.0))
-        
-        return {
-            'question': query,
-            'answer': self.answers[idx],
-            'confidence': confidence,
-            'matched_question': self.questions[idx],
-            'distance': distance
-        }
+            return Answer(
+                query,
+                "I don't have information about that in my knowledge base.",
+                0.0,
+                None,
+                1.0,
+            )
+        
+        idx, score = results[0]
+        
+        # Cosine similarity is the confidence, cosine distance kept for reference
+        return Answer(query, self.answers[idx], score, self.questions[idx], 1.0 - score)
     
     def get_context(self, query: str, top_k: int = 2) -> str:
         """
@@ -176,15 +382,10 @@ Answer: Yes, you can change your plan at any time. Upgrades take effect immediat
         """
         results = self.search(query, top_k=top_k)
         
-        if not results:
-            return "No relevant information found in knowledge base."
-        
-        context_parts = []
-        for i, (idx, distance) in enumerate(results, 1):
-            context_parts.append(f"""Q: {self.questions[idx]}
-A: {self.answers[idx]}""")
-        
-        return "\n\n".join(context_parts)
+        return (
+            "\n\n".join(self._qa_formatted[idx] for idx, _ in results)
+            or "No relevant information found in knowledge base."
+        )
 
 
 # Test the system
@@ -210,7 +411,7 @@ if __name__ == "__main__":
         
         result = rag.get_answer(query)
         
-        print(f"Matched: {result['matched_question']}")
-        print(f"Confidence: {result['confidence']:.2%}")
-        print(f"Distance: {result['distance']:.4f}")
-        print(f"\nAnswer: {result['answer']}")
\ No newline at end of file
+        print(f"Matched: {result.matched_question}")
+        print(f"Confidence: {result.confidence:.2%}")
+        print(f"Distance: {result.distance:.4f}")
+        print(f"\nAnswer: {result.answer}")
\ No newline at end of file
@@ -7,6 +7,7 @@ from livekit.agents.llm import function_tool
 from livekit.agents import (
     AutoSubscribe,
     JobContext,
+    JobProcess,
     WorkerOptions,
     cli,  
     
@@ -17,7 +18,13 @@ load_dotenv()
 logger = logging.getLogger("gemini-agent")
 logger.setLevel(logging.INFO)
 
-rag = RAGSystem()
+def prewarm(proc: JobProcess):
+    """Build the RAG in the idle job process, before any user is waiting"""
+    rag = RAGSystem()
+    # Embeddings may come from disk; load the encoder now so the
+    # first question doesn't pay for it
+    rag.model
+    proc.userdata["rag"] = rag
 
 
 async def entrypoint(ctx: JobContext):
@@ -26,6 +33,8 @@ async def entrypoint(ctx: JobContext):
     await ctx.connect(auto_subscribe=AutoSubscribe.AUDIO_ONLY)
     logger.info("Connected to room")
 
+    rag = ctx.proc.userdata["rag"]
+
     logger.info("Initializing Gemini model")
     model = google.beta.realtime.RealtimeModel(
         model="gemini-live-2.5-flash-preview",  
@@ -40,10 +49,10 @@ async def entrypoint(ctx: JobContext):
         Args:
             query: The user's question or keywords to search for
         """
-        logger.info(f"Tool called with query: {query}")
+        logger.info("Tool called with query: %s", query)
         
       
-        return rag.get_context(query)
+        return await asyncio.to_thread(rag.get_context, query)
     agent = Agent(
         instructions=(
             "You are a helpful customer support assistant. Answer questions using ONLY the knowledge base.\n"
@@ -85,16 +94,21 @@ if __name__ == "__main__":
     missing = [v for v in required_vars if not os.getenv(v)]
     
     if missing:
-        logger.error(f"Missing environment variables: {', '.join(missing)}")
+        logger.error("Missing environment variables: %s", ', '.join(missing))
         logger.error("Add these to your .env file:")
         logger.error("  - Get Google API key: https://aistudio.google.com/apikey")
         logger.error("  - Get LiveKit creds: https://cloud.livekit.io/")
         exit(1)
     
     logger.info("✅ Environment loaded")
-    logger.info(f"LiveKit URL: {os.getenv('LIVEKIT_URL')}")
+    logger.info("LiveKit URL: %s", os.getenv('LIVEKIT_URL'))
     logger.info("")
     
-    cli.run_app(WorkerOptions(entrypoint_fnc=entrypoint))
+    cli.run_app(WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        # Cold encoder load can exceed the default 10s
+        initialize_process_timeout=60,
+    ))
 
 
@@ -1,12 +1,19 @@
 """
 LiveKit Token Server - FIXED VERSION
 Port 8080 - Generates access tokens for clients
+
+Served by gunicorn with gevent workers:
+    gunicorn -k gevent -w 4 --worker-connections 1000 -b 0.0.0.0:8080 token_server:app
 """
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from livekit import api
+import dataclasses
+import importlib.util
 import os
+import secrets
+import sys
 from dotenv import load_dotenv
 import logging
 
@@ -35,6 +42,13 @@ if not all([LIVEKIT_API_KEY, LIVEKIT_API_SECRET, LIVEKIT_URL]):
     logger.error("   Required: LIVEKIT_API_KEY, LIVEKIT_API_SECRET, LIVEKIT_URL")
     exit(1)
 
+# Default permissions; only the room changes per request
+_BASE_GRANTS = api.VideoGrants(
+    room_join=True,
+    can_publish=True,
+    can_subscribe=True,
+    can_publish_data=True,
+)
 
 @app.route('/token', methods=['POST', 'OPTIONS'])
 def create_token():
@@ -60,30 +74,22 @@ def create_token():
     try:
         data = request.json or {}
         room_name = data.get('room', 'voice-agent-room')
-        identity = data.get('identity', 'user-' + os.urandom(4).hex())
+        identity = data.get('identity', 'user-' + secrets.token_hex(4))
         
-        logger.info(f"🎟️  Generating token for {identity} in room {room_name}")
+        logger.info("🎟️  Generating token for %s in room %s", identity, room_name)
         
         # Create access token
-        token = api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
-        token.with_identity(identity)
-        token.with_name(identity)
-        
-        # Grant permissions
-        token.with_grants(
-            api.VideoGrants(
-                room_join=True,
-                room=room_name,
-                can_publish=True,
-                can_subscribe=True,
-                can_publish_data=True,
-            )
+        token = (
+            api.AccessToken(LIVEKIT_API_KEY, LIVEKIT_API_SECRET)
+            .with_identity(identity)
+            .with_name(identity)
+            .with_grants(dataclasses.replace(_BASE_GRANTS, room=room_name))
         )
         
         # Generate JWT
         jwt_token = token.to_jwt()
         
-        logger.info(f"✅ Token generated for {identity}")
+        logger.info("✅ Token generated for %s", identity)
         
         response = jsonify({
             'token': jwt_token,
@@ -93,7 +99,7 @@ def create_token():
         return response
         
     except Exception as e:
-        logger.error(f"❌ Error generating token: {e}")
+        logger.error("❌ Error generating token: %s", e)
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
@@ -134,5 +140,21 @@ if __name__ == '__main__':
     logger.info("")
     logger.info("="*60 + "\n")
     
-    # Run on port 8080
-    app.run(host='0.0.0.0', port=8080, debug=True, use_reloader=True)
\ No newline at end of file
+    # Gunicorn is POSIX-only; elsewhere (or if it isn't installed) use
+    # Flask's threaded server, without the debugger or reloader
+    if os.name == 'nt' or not all(
+        importlib.util.find_spec(m) for m in ('gunicorn', 'gevent')
+    ):
+        logger.info("gunicorn/gevent unavailable, using Flask's built-in server")
+        app.run(host='0.0.0.0', port=8080)
+        sys.exit(0)
+    
+    # Hand over to gunicorn on port 8080
+    os.execvp(sys.executable, [
+        sys.executable, '-m', 'gunicorn',
+        '-k', 'gevent',
+        '-w', '4',
+        '--worker-connections', '1000',
+        '-b', '0.0.0.0:8080',
+        'token_server:app',
+    ])
\ No newline at end of file